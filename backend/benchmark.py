@@ -0,0 +1,339 @@
+"""Load-test and benchmark suite for the Study Vault API.
+
+Starts server.py under uvicorn against a throwaway local mongod (or an
+existing MongoDB given with --mongo-url), seeds it with notes and PDFs, drives
+concurrent workloads and prints a JSON report. Cold start time (fresh
+interpreter to first successful /api/ready) is timed first, over --startup-runs:
+
+    python benchmark.py --notes 500 --pdf-kb 256 --concurrency 16 --output bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import requests
+from gridfs import GridFSBucket
+from pymongo import MongoClient
+
+ROOT_DIR = Path(__file__).parent
+SORT_OPTIONS = ["date_desc", "date_asc", "name_asc", "name_desc", "category", "custom"]
+CATEGORIES = ["Mathematics", "GKGI", "History", "Science", "Geography", "Economics", "English", "Political", "Other"]
+ADMIN_PASSWORD = "Dharam@2003"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until(check, timeout: float, what: str, proc=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{what} exited with code {proc.returncode} before becoming ready")
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def wait_ready(proc, check, timeout: float, what: str):
+    """Wait for a freshly spawned child, and never leave it running if that fails."""
+    try:
+        wait_until(check, timeout, what, proc)
+    except BaseException:
+        stop(proc)
+        raise
+
+def make_pdf(size: int) -> bytes:
+    header = b"%PDF-1.4\n"
+    footer = b"\n%%EOF"
+    return header + os.urandom(max(size - len(header) - len(footer), 0)) + footer
+
+def slugify(text: str) -> str:
+    # same rules as server.slugify, kept local so the server is not imported here
+    text = re.sub(r'[^a-z0-9]+', '-', text.strip().lower()).strip('-')
+    return re.sub(r'-{2,}', '-', text)
+
+def start_mongod(workdir: Path):
+    mongod = shutil.which("mongod")
+    if not mongod:
+        raise RuntimeError("mongod not found on PATH; pass --mongo-url to use an existing server")
+    port = free_port()
+    dbpath = workdir / "db"
+    dbpath.mkdir()
+    proc = subprocess.Popen(
+        [mongod, "--dbpath", str(dbpath), "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    url = f"mongodb://127.0.0.1:{port}"
+    # one client for every poll; each MongoClient starts its own monitor threads
+    client = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        wait_ready(proc, lambda: client.admin.command("ping"), 30, "mongod")
+    finally:
+        client.close()
+    return proc, url
+
+def seed(mongo_url: str, db_name: str, notes: int, pdf_size: int):
+    """Drop db_name and fill it with notes; main() guards which databases may be dropped."""
+    client = MongoClient(mongo_url)
+    client.drop_database(db_name)
+    db = client[db_name]
+    bucket = GridFSBucket(db)
+    pdf = make_pdf(pdf_size)
+    now = datetime.now(timezone.utc)
+
+    docs = []
+    for i in range(notes):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        title = f"Benchmark Note {i:06d}"
+        file_id = bucket.upload_from_stream(f"note-{i}.pdf", io.BytesIO(pdf), metadata={"content_type": "application/pdf"})
+        category_slug = slugify(category)
+        slug = slugify(title)
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "title": title,
+            "description": "Seeded by benchmark.py",
+            "category": category,
+            "category_slug": category_slug,
+            "slug": slug,
+            "pdf_file_id": str(file_id),
+            "pdf_filename": f"note-{i}.pdf",
+            "upload_date": (now - timedelta(minutes=i)).isoformat(),
+            "share_link": f"{category_slug}/{slug}",
+            "order": i,
+        })
+    if docs:
+        db.notes.insert_many(docs)
+    client.close()
+    return docs
+
+def start_server(mongo_url: str, db_name: str, workers: int):
+    """Launch uvicorn and wait for /api/ready; also returns spawn-to-ready seconds."""
+    port = free_port()
+    env = dict(os.environ, MONGO_URL=mongo_url, DB_NAME=db_name)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT_DIR,
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}/api"
+    wait_ready(proc, lambda: requests.get(f"{base_url}/ready", timeout=1).ok, 60, "server")
+    return proc, base_url, time.perf_counter() - started
+
+def measure_startup(mongo_url: str, db_name: str, runs: int) -> dict:
+    """Cold start: fresh interpreter, import server.py, lifespan, first successful MongoDB ping."""
+    spawn_to_ready = []
+    import_to_ready = []
+    for _ in range(runs):
+        proc, base_url, elapsed = start_server(mongo_url, db_name, 1)
+        try:
+            import_to_ready.append(requests.get(f"{base_url}/ready", timeout=5).json()["import_to_ready_ms"])
+        finally:
+            stop(proc)
+        spawn_to_ready.append(elapsed * 1000)
+    spawn_to_ready.sort()
+    import_to_ready.sort()
+    return {
+        "runs": runs,
+        "spawn_to_ready_ms": {
+            "min": round(spawn_to_ready[0], 3),
+            "p50": round(percentile(spawn_to_ready, 50), 3),
+        },
+        "import_to_ready_ms": {
+            "min": round(import_to_ready[0], 3),
+            "p50": round(percentile(import_to_ready, 50), 3),
+        },
+    }
+
+def process_tree_peak_rss_kb(pid: int) -> int:
+    """Sum of VmHWM over the server process and its workers (Linux only)."""
+    pids = [pid]
+    children = Path(f"/proc/{pid}/task/{pid}/children")
+    if children.exists():
+        pids += [int(p) for p in children.read_text().split()]
+    total = 0
+    for p in pids:
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1])
+        except FileNotFoundError:
+            continue
+    return total
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def run_workload(name: str, make_request, total: int, concurrency: int) -> dict:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            response = make_request(session, i)
+            ok = response.ok
+            response.content
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    session.close()
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "workload": name,
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+def build_workloads(base_url: str, docs: list, pdf_size: int, token: str):
+    workloads = []
+    for sort_by in SORT_OPTIONS:
+        workloads.append((
+            f"list_{sort_by}",
+            lambda s, i, sort_by=sort_by: s.get(f"{base_url}/notes", params={"sort_by": sort_by})
+        ))
+    if docs:
+        workloads.append((
+            "slug_lookup",
+            lambda s, i: s.get(f"{base_url}/notes/by-link/{docs[i % len(docs)]['share_link']}")
+        ))
+        workloads.append((
+            "pdf_download",
+            lambda s, i: s.get(f"{base_url}/pdf/{docs[i % len(docs)]['pdf_file_id']}")
+        ))
+    # uploads go last so they do not change what the listings above return
+    upload_pdf = make_pdf(pdf_size)
+    workloads.append((
+        "pdf_upload",
+        lambda s, i: s.post(
+            f"{base_url}/notes/upload",
+            data={"title": f"Upload {i}", "description": "", "category": CATEGORIES[i % len(CATEGORIES)]},
+            files={"file": (f"upload-{i}.pdf", upload_pdf, "application/pdf")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    ))
+    return workloads
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", help="use this MongoDB instead of starting a local mongod")
+    parser.add_argument("--db-name", default="study_vault_bench", help="dropped and reseeded on every run")
+    parser.add_argument("--allow-drop", action="store_true",
+                        help="allow dropping a --db-name on --mongo-url that does not contain 'bench'")
+    parser.add_argument("--notes", type=int, default=200, help="number of notes to seed")
+    parser.add_argument("--pdf-kb", type=int, default=128, help="size of each seeded/uploaded PDF")
+    parser.add_argument("--requests", type=int, default=500, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--startup-runs", type=int, default=3, help="cold starts to time (0 to skip)")
+    parser.add_argument("--only", nargs="*", help="run only these workloads")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if args.mongo_url and "bench" not in args.db_name.lower() and not args.allow_drop:
+        parser.error(f"refusing to drop {args.db_name!r} on --mongo-url; use a *bench* database name or pass --allow-drop")
+
+    pdf_size = args.pdf_kb * 1024
+    workdir = Path(tempfile.mkdtemp(prefix="study-vault-bench-"))
+    mongod = server = None
+    try:
+        mongo_url = args.mongo_url
+        if not mongo_url:
+            mongod, mongo_url = start_mongod(workdir)
+        docs = seed(mongo_url, args.db_name, args.notes, pdf_size)
+        startup = None
+        if args.startup_runs > 0:
+            print("timing cold starts...", file=sys.stderr)
+            startup = measure_startup(mongo_url, args.db_name, args.startup_runs)
+        server, base_url, _ = start_server(mongo_url, args.db_name, args.workers)
+        token = requests.post(f"{base_url}/auth/login", json={"password": ADMIN_PASSWORD}).json()["access_token"]
+
+        results = []
+        for name, make_request in build_workloads(base_url, docs, pdf_size, token):
+            if args.only and name not in args.only:
+                continue
+            print(f"running {name}...", file=sys.stderr)
+            results.append(run_workload(name, make_request, args.requests, args.concurrency))
+
+        report = {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {
+                "notes": args.notes,
+                "pdf_kb": args.pdf_kb,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "workers": args.workers,
+            },
+            "startup": startup,
+            "server_peak_rss_kb": process_tree_peak_rss_kb(server.pid),
+            "workloads": results,
+        }
+    finally:
+        for proc in (server, mongod):
+            if proc is not None:
+                stop(proc)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return 1 if any(r["errors"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""In-process request metrics rendered in the Prometheus text format.
+
+Counters live in this worker's memory; under multi-worker uvicorn each worker
+reports its own series and the scraper aggregates them.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (
+    64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2,
+    16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2
+)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.kind != "histogram":
+            # unlabelled series are exported as 0 before the first event
+            self._values[()] = 0
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _render_sample(self, key, value) -> list:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route template and status.",
+    ("method", "route", "status")
+))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ("method", "route")
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."
+))
+GRIDFS_BYTES_READ = REGISTRY.register(Counter(
+    "gridfs_bytes_read_total", "Bytes read from GridFS."
+))
+GRIDFS_BYTES_WRITTEN = REGISTRY.register(Counter(
+    "gridfs_bytes_written_total", "Bytes written to GridFS."
+))
+UPLOAD_SIZE = REGISTRY.register(Histogram(
+    "upload_size_bytes", "Size of uploaded PDF files.", buckets=SIZE_BUCKETS
+))
+MONGO_LATENCY = REGISTRY.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip time.",
+    ("collection", "command")
+))
+MONGO_FAILURES = REGISTRY.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error.",
+    ("collection", "command")
+))
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed to the last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            # the router stores the matched route in the shared scope
+            route = scope.get("route")
+            route = getattr(route, "path", "<unmatched>")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+
+def _command_collection(event) -> str:
+    command = event.command
+    if event.command_name == "getMore":
+        return command.get("collection", "")
+    target = command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command Motor sends; called from pymongo's worker threads."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self._pending[event.request_id] = _command_collection(event)
+
+    def _finish(self, event):
+        with self._lock:
+            collection = self._pending.pop(event.request_id, "")
+        return collection
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        MONGO_LATENCY.observe(
+            event.duration_micros / 1e6, collection=collection, command=event.command_name
+        )
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGO_LATENCY.observe(
+            event.duration_micros / 1e6, collection=collection, command=event.command_name
+        )
+        MONGO_FAILURES.inc(collection=collection, command=event.command_name)
+
+MONGO_POOL_OPEN = REGISTRY.register(Gauge(
+    "mongodb_pool_connections_open", "Connections open in the MongoDB pool.", ("address",)
+))
+MONGO_POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "mongodb_pool_connections_checked_out", "Pooled connections currently in use.", ("address",)
+))
+MONGO_POOL_WAITING = REGISTRY.register(Gauge(
+    "mongodb_pool_wait_queue", "Operations waiting for a pooled connection.", ("address",)
+))
+MONGO_POOL_CHECKOUT_FAILURES = REGISTRY.register(Counter(
+    "mongodb_pool_checkout_failures_total", "Connection check-outs that failed or timed out.",
+    ("address", "reason")
+))
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Tracks per-server pool usage so saturation can be reported."""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _update(self, address, field: str, delta: int):
+        label = "%s:%s" % address
+        with self._lock:
+            pool = self._pools.setdefault(label, {"open": 0, "checked_out": 0, "waiting": 0})
+            pool[field] += delta
+        gauge = {"open": MONGO_POOL_OPEN, "checked_out": MONGO_POOL_CHECKED_OUT, "waiting": MONGO_POOL_WAITING}[field]
+        gauge.inc(delta, address=label)
+
+    def stats(self) -> dict:
+        """Totals over all server pools; addresses are left out so this can be public."""
+        with self._lock:
+            pools = [dict(pool) for pool in self._pools.values()]
+        busiest = max((p["checked_out"] for p in pools), default=0)
+        return {
+            "max_pool_size": self.max_pool_size,
+            # the fullest single pool, since each server has its own limit
+            "saturation": round(busiest / self.max_pool_size, 4) if self.max_pool_size else 0.0,
+            "servers": len(pools),
+            "open": sum(p["open"] for p in pools),
+            "checked_out": sum(p["checked_out"] for p in pools),
+            "waiting": sum(p["waiting"] for p in pools),
+        }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, "open", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, "waiting", 1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, "waiting", -1)
+        MONGO_POOL_CHECKOUT_FAILURES.inc(address="%s:%s" % event.address, reason=event.reason)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, "waiting", -1)
+        self._update(event.address, "checked_out", 1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, "checked_out", -1)
@@ -0,0 +1,188 @@
+"""Opt-in per-request sampling profiler and slow-request log.
+
+A request is profiled when an admin sends ``X-Profile: 1`` (or ``true``, or
+``?profile=1``); the response body is then replaced by the sampled stacks in
+the folded "stack;frames count" format read by flamegraph.pl and speedscope.
+Every request slower than the configured threshold is written to the slow log
+with its time split between MongoDB round trips and everything else.
+
+The sampler is a plain Python thread, so it needs the GIL to take each
+sample. While the profiled code is CPU-bound the interpreter only switches
+threads every ``sys.getswitchinterval()`` (5 ms by default), so the real rate
+is far below the configured one: a 200 ms CPU-bound request gives roughly 30
+samples at the 1 ms default. Treat sample counts as relative weights, not
+times. Each sample also takes the GIL away from the event loop for a moment,
+so every request on the worker runs a little slower while a profile is taken.
+Stopping the sampler does not block the loop; the thread exits at its next
+wake-up.
+"""
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from pymongo import monitoring
+
+slow_logger = logging.getLogger("study_vault.slow_requests")
+
+class RequestTiming:
+    __slots__ = ("db_seconds", "db_calls")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_calls = 0
+
+# Motor runs commands on executor threads with the caller's context copied,
+# so the listener sees the timing object of the request that issued them.
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+class DbTimingListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def _record(self, event):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.db_seconds += event.duration_micros / 1e6
+            timing.db_calls += 1
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread.
+
+    The event loop thread is shared, so samples taken while other requests
+    are running on it are attributed to the profiled request too.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> str:
+        # no join: waiting for the thread would stall the event loop for up to
+        # one interval, and the lock keeps a late sample out of the snapshot
+        with self._lock:
+            self._stop.set()
+            samples = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                with self._lock:
+                    if self._stop.is_set():
+                        break
+                    self.samples[";".join(reversed(stack))] += 1
+
+PROFILE_ON_VALUES = ("1", "true")
+
+def _profile_requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile" and value.decode("latin-1").strip().lower() in PROFILE_ON_VALUES:
+            return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[-1].strip().lower() in PROFILE_ON_VALUES
+
+def _bearer_token(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                return token
+    return ""
+
+class ProfilingMiddleware:
+    def __init__(self, app, is_admin, slow_threshold: float = 1.0, interval: float = 0.001):
+        self.app = app
+        self.is_admin = is_admin
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        status = 500
+        sampler = None
+        if _profile_requested(scope) and self.is_admin(_bearer_token(scope)):
+            sampler = StackSampler(threading.get_ident(), self.interval)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            # a profiled request answers with the profile instead of its own body
+            if sampler is None:
+                await send(message)
+
+        start = time.perf_counter()
+        try:
+            if sampler is not None:
+                sampler.start()
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    profile = sampler.stop()
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_timing.reset(token)
+            if elapsed >= self.slow_threshold:
+                self._log_slow(scope, status, elapsed, timing)
+
+        if sampler is not None:
+            await self._send_profile(send, profile, status, elapsed, timing)
+
+    def _log_slow(self, scope, status, elapsed, timing):
+        slow_logger.warning(json.dumps({
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(scope.get("route"), "path", None),
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "db_ms": round(timing.db_seconds * 1000, 3),
+            "db_calls": timing.db_calls,
+            "python_ms": round(max(elapsed - timing.db_seconds, 0.0) * 1000, 3),
+        }))
+
+    async def _send_profile(self, send, profile, status, elapsed, timing):
+        body = profile.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-status", str(status).encode()),
+                (b"x-profile-duration-ms", f"{elapsed * 1000:.3f}".encode()),
+                (b"x-profile-db-ms", f"{timing.db_seconds * 1000:.3f}".encode()),
+                (b"x-profile-db-calls", str(timing.db_calls).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
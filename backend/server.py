@@ -1,10 +1,18 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from motor.motor_asyncio import (
+    AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+)
+from pymongo import ReadPreference
+from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -16,15 +24,31 @@ from passlib.context import CryptContext
 import io
 from bson import ObjectId
 import re
+import hmac
+import struct
+import zlib
+from metrics import (
+    REGISTRY, MetricsMiddleware, MongoCommandListener, PoolListener,
+    GRIDFS_BYTES_READ, GRIDFS_BYTES_WRITTEN, UPLOAD_SIZE
+)
+from profiling import ProfilingMiddleware, DbTimingListener, slow_logger
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-fs = AsyncIOMotorGridFSBucket(db)
+# MongoDB settings
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '20000'))
+MONGO_SOCKET_TIMEOUT_MS = os.environ.get('MONGO_SOCKET_TIMEOUT_MS')
+# public GET routes may be served from secondaries
+MONGO_READ_SECONDARY_PREFERRED = os.environ.get('MONGO_READ_SECONDARY_PREFERRED', 'false').lower() in ('1', 'true', 'yes')
+# /api/ready gives up on the ping after this, well inside probe timeouts
+MONGO_READY_TIMEOUT_MS = int(os.environ.get('MONGO_READY_TIMEOUT_MS', '1000'))
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -33,8 +57,14 @@ SECRET_KEY = "study-vault-secret-key-2024"
 ALGORITHM = "HS256"
 ADMIN_PASSWORD = "Dharam@2003"
 
-# Create the main app
-app = FastAPI()
+# Profiling / slow request log
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '1'))
+SLOW_LOG_PATH = os.environ.get('SLOW_LOG_PATH')
+
+# Bearer token for scraping /api/metrics; an admin login token also works
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 api_router = APIRouter(prefix="/api")
 
 # Predefined categories
@@ -61,6 +91,73 @@ def slugify(text: str) -> str:
     text = re.sub(r'-{2,}', '-', text)
     return text or str(uuid.uuid4())[:8]
 
+# ZIP export helpers (STORED entries streamed straight from GridFS chunks)
+ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+ZIP_DATA_DESCRIPTOR = struct.Struct("<IIII")
+ZIP_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+ZIP_END_RECORD = struct.Struct("<IHHHHIIH")
+ZIP_VERSION = 20
+# bit 3: crc/sizes follow the data, bit 11: names are utf-8
+ZIP_FLAGS = 0x0008 | 0x0800
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+def zip_dos_datetime(dt: datetime):
+    if dt.year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+    dos_date = ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+    return dos_time, dos_date
+
+def zip_archive_size(entries: list) -> int:
+    size = ZIP_END_RECORD.size
+    for entry in entries:
+        name_len = len(entry["name"])
+        size += ZIP_LOCAL_HEADER.size + name_len + entry["size"] + ZIP_DATA_DESCRIPTOR.size
+        size += ZIP_CENTRAL_HEADER.size + name_len
+    return size
+
+async def stream_zip(entries: list):
+    # Every entry is STORED and its crc is written in a data descriptor after
+    # the data, so only one GridFS chunk is held in memory at a time.
+    central_directory = []
+    offset = 0
+    for entry in entries:
+        name = entry["name"]
+        dos_time, dos_date = entry["dos_datetime"]
+        header = ZIP_LOCAL_HEADER.pack(
+            0x04034b50, ZIP_VERSION, ZIP_FLAGS, 0, dos_time, dos_date,
+            0, 0, 0, len(name), 0
+        )
+        yield header + name
+
+        crc = 0
+        size = 0
+        grid_out = entry["grid_out"]
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            GRIDFS_BYTES_READ.inc(len(chunk))
+            yield chunk
+        if size != entry["size"]:
+            raise IOError(f"GridFS file for {name.decode()} changed while streaming")
+
+        yield ZIP_DATA_DESCRIPTOR.pack(0x08074b50, crc, size, size)
+        central_directory.append(ZIP_CENTRAL_HEADER.pack(
+            0x02014b50, ZIP_VERSION, ZIP_VERSION, ZIP_FLAGS, 0, dos_time, dos_date,
+            crc, size, size, len(name), 0, 0, 0, 0, 0, offset
+        ) + name)
+        offset += len(header) + len(name) + size + ZIP_DATA_DESCRIPTOR.size
+
+    directory = b"".join(central_directory)
+    yield directory
+    yield ZIP_END_RECORD.pack(
+        0x06054b50, 0, 0, len(entries), len(entries), len(directory), offset, 0
+    )
+
 # Models
 class AdminLogin(BaseModel):
     password: str
@@ -97,6 +194,17 @@ class NoteResponse(BaseModel):
     share_link: str
     order: int
 
+NOTE_BATCH_MAX = 500
+
+class NoteBatchRequest(BaseModel):
+    # note ids or "category_slug/slug" share links, in the order wanted back
+    ids: List[str] = Field(..., max_length=NOTE_BATCH_MAX)
+
+class NoteBatchResult(BaseModel):
+    key: str
+    found: bool
+    note: Optional[NoteResponse] = None
+
 class NoteUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -104,6 +212,23 @@ class NoteUpdate(BaseModel):
     order: Optional[int] = None
 
 # Helper functions
+def note_to_response(note: dict) -> NoteResponse:
+    if isinstance(note['upload_date'], str):
+        note['upload_date'] = datetime.fromisoformat(note['upload_date'])
+    return NoteResponse(
+        id=note['id'],
+        title=note['title'],
+        description=note.get('description', ""),
+        category=note['category'],
+        category_slug=note.get('category_slug', slugify(note['category'])),
+        slug=note.get('slug', note['id']),
+        pdf_file_id=note['pdf_file_id'],
+        pdf_filename=note['pdf_filename'],
+        upload_date=note['upload_date'].isoformat(),
+        share_link=note['share_link'],
+        order=note.get('order', 0)
+    )
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(hours=24)
@@ -111,6 +236,34 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def is_admin_token(token: str) -> bool:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get("role") == "admin"
+
+# MongoDB handles live on app.state, created per app by its lifespan.
+# read_db/read_fs are the handles public read routes use.
+def get_db(request: Request) -> AsyncIOMotorDatabase:
+    return request.app.state.db
+
+def get_fs(request: Request) -> AsyncIOMotorGridFSBucket:
+    return request.app.state.fs
+
+def get_read_db(request: Request) -> AsyncIOMotorDatabase:
+    return request.app.state.read_db
+
+def get_read_fs(request: Request) -> AsyncIOMotorGridFSBucket:
+    return request.app.state.read_fs
+
+async def verify_metrics_access(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    if METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    if not is_admin_token(token):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
 async def verify_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -136,13 +289,75 @@ async def login(credentials: AdminLogin):
 async def get_categories():
     return {"categories": PREDEFINED_CATEGORIES}
 
+@api_router.get("/categories/{category_slug}/export.zip")
+async def export_category_zip(
+    category_slug: str,
+    read_db: AsyncIOMotorDatabase = Depends(get_read_db),
+    read_fs: AsyncIOMotorGridFSBucket = Depends(get_read_fs)
+):
+    if category_slug not in {slugify(c) for c in PREDEFINED_CATEGORIES}:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    notes = await read_db.notes.find(
+        {"category_slug": category_slug},
+        {"_id": 0, "id": 1, "slug": 1, "pdf_file_id": 1, "upload_date": 1, "order": 1}
+    ).to_list(None)
+    notes.sort(key=lambda x: (x.get('order', 0), x.get('slug', x['id'])))
+
+    # One query for every file's length and a readable handle on its chunks.
+    # The cursor yields synchronous gridfs.GridOut objects, so each one is
+    # wrapped to run readchunk() on Motor's executor instead of the event loop.
+    file_ids = [ObjectId(n['pdf_file_id']) for n in notes if ObjectId.is_valid(n['pdf_file_id'])]
+    grid_outs = {}
+    async for grid_out in read_fs.find({"_id": {"$in": file_ids}}):
+        grid_outs[str(grid_out._id)] = grid_out
+
+    entries = []
+    names = set()
+    for note in notes:
+        grid_out = grid_outs.get(note['pdf_file_id'])
+        if grid_out is None:
+            continue
+        base_name = note.get('slug') or note['id']
+        name = f"{base_name}.pdf"
+        counter = 1
+        while name in names:
+            name = f"{base_name}-{counter}.pdf"
+            counter += 1
+        names.add(name)
+
+        upload_date = note['upload_date']
+        if isinstance(upload_date, str):
+            upload_date = datetime.fromisoformat(upload_date)
+        entries.append({
+            "name": name.encode("utf-8"),
+            "size": grid_out.length,
+            "dos_datetime": zip_dos_datetime(upload_date),
+            "grid_out": AsyncIOMotorGridOut(read_fs.collection, delegate=grid_out),
+        })
+
+    archive_size = zip_archive_size(entries)
+    if archive_size > ZIP_MAX_SIZE or len(entries) > ZIP_MAX_ENTRIES:
+        raise HTTPException(status_code=413, detail="Category is too large to export as one archive")
+
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={category_slug}.zip",
+            "Content-Length": str(archive_size)
+        }
+    )
+
 @api_router.post("/notes/upload")
 async def upload_note(
     title: str = Form(...),
     description: str = Form(""),
     category: str = Form(...),
     file: UploadFile = File(...),
-    admin: dict = Depends(verify_admin)
+    admin: dict = Depends(verify_admin),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket = Depends(get_fs)
 ):
     # Validate category
     if category not in PREDEFINED_CATEGORIES:
@@ -154,11 +369,13 @@ async def upload_note(
     
     # Upload file to GridFS
     contents = await file.read()
+    UPLOAD_SIZE.observe(len(contents))
     file_id = await fs.upload_from_stream(
         file.filename,
         io.BytesIO(contents),
         metadata={"content_type": "application/pdf"}
     )
+    GRIDFS_BYTES_WRITTEN.inc(len(contents))
     
     # Create slug and ensure uniqueness within category
     category_slug = slugify(category)
@@ -194,7 +411,8 @@ async def upload_note(
 @api_router.get("/notes", response_model=List[NoteResponse])
 async def get_notes(
     category: Optional[str] = None,
-    sort_by: Optional[str] = "date_desc"
+    sort_by: Optional[str] = "date_desc",
+    read_db: AsyncIOMotorDatabase = Depends(get_read_db)
 ):
     # Build query
     query = {}
@@ -202,7 +420,7 @@ async def get_notes(
         query["category"] = category
     
     # Fetch notes
-    notes = await db.notes.find(query, {"_id": 0}).to_list(1000)
+    notes = await read_db.notes.find(query, {"_id": 0}).to_list(1000)
     
     # Convert datetime
     for note in notes:
@@ -224,73 +442,77 @@ async def get_notes(
         notes.sort(key=lambda x: x.get('order', 0))
     
     # Format response
+    return [note_to_response(note) for note in notes]
+
+@api_router.post("/notes/batch", response_model=List[NoteBatchResult])
+async def get_notes_batch(
+    request: NoteBatchRequest,
+    read_db: AsyncIOMotorDatabase = Depends(get_read_db)
+):
+    note_ids = set()
+    links = set()
+    for key in request.ids:
+        if "/" in key:
+            links.add(tuple(key.split("/", 1)))
+        else:
+            note_ids.add(key)
+
+    # Single round trip: ids through one $in, share links as exact
+    # (category_slug, slug) pairs. A pair is not unique (update_note keeps the
+    # slug when it moves a note to another category), so the lowest _id wins,
+    # as it does in get_note_by_slug.
+    clauses = []
+    if note_ids:
+        clauses.append({"id": {"$in": sorted(note_ids)}})
+    for category_slug, slug in sorted(links):
+        clauses.append({"category_slug": category_slug, "slug": slug})
+
+    by_key = {}
+    if clauses:
+        notes = await read_db.notes.find(
+            {"$or": clauses}, {"_id": 0}, sort=[("_id", 1)]
+        ).to_list(None)
+        for note in notes:
+            by_key.setdefault(note['id'], note)
+            if note.get('category_slug') and note.get('slug'):
+                by_key.setdefault(f"{note['category_slug']}/{note['slug']}", note)
+
     response = []
-    for note in notes:
-        response.append(NoteResponse(
-            id=note['id'],
-            title=note['title'],
-            description=note.get('description', ""),
-            category=note['category'],
-            category_slug=note.get('category_slug', slugify(note['category'])),
-            slug=note.get('slug', note['id']),
-            pdf_file_id=note['pdf_file_id'],
-            pdf_filename=note['pdf_filename'],
-            upload_date=note['upload_date'].isoformat(),
-            share_link=note['share_link'],
-            order=note.get('order', 0)
-        ))
-    
+    for key in request.ids:
+        note = by_key.get(key)
+        if note is None:
+            response.append(NoteBatchResult(key=key, found=False))
+        else:
+            response.append(NoteBatchResult(key=key, found=True, note=note_to_response(note)))
     return response
 
 @api_router.get("/notes/{note_id}")
-async def get_note(note_id: str):
-    note = await db.notes.find_one({"id": note_id}, {"_id": 0})
+async def get_note(note_id: str, read_db: AsyncIOMotorDatabase = Depends(get_read_db)):
+    note = await read_db.notes.find_one({"id": note_id}, {"_id": 0})
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    if isinstance(note['upload_date'], str):
-        note['upload_date'] = datetime.fromisoformat(note['upload_date'])
-    
-    return NoteResponse(
-        id=note['id'],
-        title=note['title'],
-        description=note.get('description', ""),
-        category=note['category'],
-        category_slug=note.get('category_slug', slugify(note['category'])),
-        slug=note.get('slug', note['id']),
-        pdf_file_id=note['pdf_file_id'],
-        pdf_filename=note['pdf_filename'],
-        upload_date=note['upload_date'].isoformat(),
-        share_link=note['share_link'],
-        order=note.get('order', 0)
-    )
+    return note_to_response(note)
 
 @api_router.get("/notes/by-link/{category_slug}/{slug}")
-async def get_note_by_slug(category_slug: str, slug: str):
-    note = await db.notes.find_one({"category_slug": category_slug, "slug": slug}, {"_id": 0})
+async def get_note_by_slug(
+    category_slug: str,
+    slug: str,
+    read_db: AsyncIOMotorDatabase = Depends(get_read_db)
+):
+    note = await read_db.notes.find_one(
+        {"category_slug": category_slug, "slug": slug}, {"_id": 0}, sort=[("_id", 1)]
+    )
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    if isinstance(note['upload_date'], str):
-        note['upload_date'] = datetime.fromisoformat(note['upload_date'])
-    return NoteResponse(
-        id=note['id'],
-        title=note['title'],
-        description=note.get('description', ""),
-        category=note['category'],
-        category_slug=note.get('category_slug', category_slug),
-        slug=note.get('slug', slug),
-        pdf_file_id=note['pdf_file_id'],
-        pdf_filename=note['pdf_filename'],
-        upload_date=note['upload_date'].isoformat(),
-        share_link=note['share_link'],
-        order=note.get('order', 0)
-    )
+    return note_to_response(note)
 
 @api_router.put("/notes/{note_id}")
 async def update_note(
     note_id: str,
     note_update: NoteUpdate,
-    admin: dict = Depends(verify_admin)
+    admin: dict = Depends(verify_admin),
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     # Check if note exists
     existing_note = await db.notes.find_one({"id": note_id})
@@ -320,7 +542,9 @@ async def update_note(
 @api_router.delete("/notes/{note_id}")
 async def delete_note(
     note_id: str,
-    admin: dict = Depends(verify_admin)
+    admin: dict = Depends(verify_admin),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket = Depends(get_fs)
 ):
     # Get note to find file_id
     note = await db.notes.find_one({"id": note_id})
@@ -339,10 +563,11 @@ async def delete_note(
     return {"message": "Note deleted successfully"}
 
 @api_router.get("/pdf/{file_id}")
-async def get_pdf(file_id: str):
+async def get_pdf(file_id: str, read_fs: AsyncIOMotorGridFSBucket = Depends(get_read_fs)):
     try:
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
+        grid_out = await read_fs.open_download_stream(ObjectId(file_id))
         contents = await grid_out.read()
+        GRIDFS_BYTES_READ.inc(len(contents))
         
         return StreamingResponse(
             io.BytesIO(contents),
@@ -354,16 +579,41 @@ async def get_pdf(file_id: str):
     except Exception as e:
         raise HTTPException(status_code=404, detail="PDF not found")
 
-# Include the router
-app.include_router(api_router)
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(access: None = Depends(verify_metrics_access)):
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/health")
+async def health():
+    return {"status": "ok"}
+
+async def ping_mongo(app: FastAPI) -> bool:
+    # bounded here rather than by serverSelectionTimeoutMS, which defaults to 30 s
+    try:
+        await asyncio.wait_for(
+            app.state.mongo_client.admin.command("ping"),
+            MONGO_READY_TIMEOUT_MS / 1000
+        )
+    except Exception:
+        return False
+    if app.state.import_to_ready_ms is None:
+        app.state.import_to_ready_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 3)
+    return True
+
+@api_router.get("/ready")
+async def ready(request: Request):
+    app = request.app
+    ok = await ping_mongo(app)
+    content = {
+        "status": "ready" if ok else "unavailable",
+        # import until the first successful MongoDB ping
+        "import_to_ready_ms": app.state.import_to_ready_ms,
+        "pool": app.state.pool_listener.stats(),
+    }
+    return JSONResponse(status_code=200 if ok else 503, content=content)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -371,6 +621,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+if SLOW_LOG_PATH:
+    slow_log_handler = logging.FileHandler(SLOW_LOG_PATH)
+    slow_log_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_logger.addHandler(slow_log_handler)
+
+def create_mongo_client(listeners: list) -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+    }
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = int(MONGO_SOCKET_TIMEOUT_MS)
+    return AsyncIOMotorClient(MONGO_URL, event_listeners=listeners, **options)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool_listener = PoolListener(MONGO_MAX_POOL_SIZE)
+    client = create_mongo_client([MongoCommandListener(), DbTimingListener(), pool_listener])
+    db = client[DB_NAME]
+    fs = AsyncIOMotorGridFSBucket(db)
+    if MONGO_READ_SECONDARY_PREFERRED:
+        read_db = client.get_database(DB_NAME, read_preference=ReadPreference.SECONDARY_PREFERRED)
+        read_fs = AsyncIOMotorGridFSBucket(read_db)
+    else:
+        read_db = db
+        read_fs = fs
+
+    app.state.mongo_client = client
+    app.state.pool_listener = pool_listener
+    app.state.db = db
+    app.state.fs = fs
+    app.state.read_db = read_db
+    app.state.read_fs = read_fs
+    app.state.import_to_ready_ms = None
+
+    # Open the first pool connection before traffic arrives; startup goes on
+    # if MongoDB is down and /api/ready keeps reporting 503 until it is back.
+    if await ping_mongo(app):
+        logger.info("Ready %.1f ms after import", app.state.import_to_ready_ms)
+    else:
+        logger.warning("MongoDB did not answer within %d ms at startup", MONGO_READY_TIMEOUT_MS)
+    try:
+        yield
+    finally:
+        client.close()
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(api_router)
+
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(
+        ProfilingMiddleware,
+        is_admin=is_admin_token,
+        slow_threshold=SLOW_REQUEST_MS / 1000,
+        interval=PROFILE_INTERVAL_MS / 1000
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+app = create_app()
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py is run from backend/ (uvicorn server:app) and reads its config at import
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:1")
+os.environ.setdefault("DB_NAME", "study_vault_test")
+# every lifespan pings that closed port once; keep the wait short
+os.environ.setdefault("MONGO_READY_TIMEOUT_MS", "200")
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+# conftest points MONGO_URL at a closed port, so MongoDB is always unreachable here
+
+def is_closed(app) -> bool:
+    # pymongo marks the topology closed once MongoClient.close() has run
+    return app.state.mongo_client.delegate._topology._closed
+
+def test_each_app_owns_its_mongo_client():
+    first = server.create_app()
+    second = server.create_app()
+
+    with TestClient(first), TestClient(second):
+        assert first.state.mongo_client is not second.state.mongo_client
+        assert first.state.read_db.name == server.DB_NAME
+
+@pytest.mark.parametrize("stopped_index", [0, 1])
+def test_shutting_down_one_app_leaves_the_other_open(stopped_index):
+    apps = [server.create_app(), server.create_app()]
+    stopped = apps[stopped_index]
+    survivor = apps[1 - stopped_index]
+
+    with TestClient(survivor):
+        survivor_client = survivor.state.mongo_client
+        with TestClient(stopped):
+            pass
+
+        assert is_closed(stopped)
+        assert survivor.state.mongo_client is survivor_client
+        assert not is_closed(survivor)
+
+    assert is_closed(survivor)
+
+def test_restarted_app_gets_a_new_client():
+    app = server.create_app()
+    with TestClient(app):
+        first_client = app.state.mongo_client
+    with TestClient(app):
+        assert app.state.mongo_client is not first_client
+
+def test_ready_fails_fast_when_mongo_is_down():
+    with TestClient(server.create_app()) as client:
+        assert client.get("/api/health").json() == {"status": "ok"}
+
+        started = time.perf_counter()
+        response = client.get("/api/ready")
+        elapsed = time.perf_counter() - started
+
+    assert response.status_code == 503
+    assert elapsed < server.MONGO_READY_TIMEOUT_MS / 1000 + 1
+    body = response.json()
+    assert body["status"] == "unavailable"
+    assert body["import_to_ready_ms"] is None
+    assert body["pool"]["max_pool_size"] == server.MONGO_MAX_POOL_SIZE
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import zipfile
+
+from bson import ObjectId
+
+import server
+
+class StubGridOut:
+    """Synchronous stand-in for gridfs.GridOut, as yielded by the bucket cursor."""
+
+    def __init__(self, data: bytes, chunk_size: int = 7):
+        self._id = ObjectId()
+        self.length = len(data)
+        self._chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    def readchunk(self):
+        return self._chunks.pop(0) if self._chunks else b""
+
+class StubMotorGridOut:
+    """Stands in for AsyncIOMotorGridOut, which only wraps real gridfs.GridOuts."""
+
+    def __init__(self, root_collection, delegate=None):
+        assert root_collection is BUCKET_COLLECTION
+        assert isinstance(delegate, StubGridOut)
+        self.delegate = delegate
+
+    async def readchunk(self):
+        return await asyncio.to_thread(self.delegate.readchunk)
+
+BUCKET_COLLECTION = object()
+
+class StubCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    async def to_list(self, length):
+        return list(self._docs)
+
+class StubCollection:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def find(self, query, projection=None):
+        return StubCursor([d for d in self._docs if d["category_slug"] == query["category_slug"]])
+
+class StubDatabase:
+    def __init__(self, notes):
+        self.notes = StubCollection(notes)
+
+class StubBucket:
+    def __init__(self, collection, grid_outs):
+        self.collection = collection
+        self._grid_outs = grid_outs
+
+    async def find(self, query):
+        wanted = set(query["_id"]["$in"])
+        for grid_out in self._grid_outs:
+            if grid_out._id in wanted:
+                yield grid_out
+
+def make_note(slug, grid_out, order=0, category_slug="mathematics"):
+    return {
+        "id": slug + "-id",
+        "slug": slug,
+        "category_slug": category_slug,
+        "pdf_file_id": str(grid_out._id),
+        "upload_date": "2024-05-01T10:03:04+00:00",
+        "order": order,
+    }
+
+async def export(monkeypatch, notes, grid_outs, category_slug="mathematics"):
+    monkeypatch.setattr(server, "AsyncIOMotorGridOut", StubMotorGridOut)
+    response = await server.export_category_zip(
+        category_slug,
+        read_db=StubDatabase(notes),
+        read_fs=StubBucket(BUCKET_COLLECTION, grid_outs)
+    )
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    return response, body
+
+def test_export_zip_streams_every_pdf(monkeypatch):
+    first = StubGridOut(b"%PDF-1.4 first note" * 10)
+    second = StubGridOut(b"%PDF-1.4 second")
+    empty = StubGridOut(b"")
+    other = StubGridOut(b"%PDF-1.4 other category")
+    notes = [
+        make_note("algebra", second, order=1),
+        make_note("calculus", first, order=0),
+        make_note("empty", empty, order=2),
+        make_note("history", other, category_slug="history"),
+    ]
+
+    response, body = asyncio.run(export(monkeypatch, notes, [first, second, empty, other]))
+
+    assert response.media_type == "application/zip"
+    assert len(body) == int(response.headers["content-length"])
+    archive = zipfile.ZipFile(io.BytesIO(body))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["calculus.pdf", "algebra.pdf", "empty.pdf"]
+    assert archive.read("calculus.pdf") == b"%PDF-1.4 first note" * 10
+    assert archive.read("algebra.pdf") == b"%PDF-1.4 second"
+    assert archive.read("empty.pdf") == b""
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+    assert archive.infolist()[0].date_time == (2024, 5, 1, 10, 3, 4)
+
+def test_export_zip_skips_missing_files_and_dedupes_names(monkeypatch):
+    present = StubGridOut(b"%PDF-1.4 present")
+    duplicate = StubGridOut(b"%PDF-1.4 duplicate")
+    missing = StubGridOut(b"never stored")
+    notes = [
+        make_note("notes", present, order=0),
+        {**make_note("notes", duplicate, order=1), "id": "other-id"},
+        make_note("gone", missing, order=2),
+    ]
+
+    response, body = asyncio.run(export(monkeypatch, notes, [present, duplicate]))
+
+    assert len(body) == int(response.headers["content-length"])
+    archive = zipfile.ZipFile(io.BytesIO(body))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["notes.pdf", "notes-1.pdf"]
+
+def test_export_zip_empty_category(monkeypatch):
+    response, body = asyncio.run(export(monkeypatch, [], []))
+
+    assert len(body) == int(response.headers["content-length"]) == 22
+    assert zipfile.ZipFile(io.BytesIO(body)).namelist() == []
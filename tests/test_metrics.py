@@ -0,0 +1,98 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+
+def render(metric):
+    return metric.render()[2:]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, op="read")
+
+    assert render(histogram) == [
+        'test_seconds_bucket{op="read",le="0.1"} 2',
+        'test_seconds_bucket{op="read",le="1"} 3',
+        'test_seconds_bucket{op="read",le="+Inf"} 4',
+        'test_seconds_sum{op="read"} 3.65',
+        'test_seconds_count{op="read"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_total", "Test.", ("route",))
+    counter.inc(route='a"b\\c\nd')
+
+    assert render(counter) == ['test_total{route="a\\"b\\\\c\\nd"} 1']
+
+def test_unlabelled_series_start_at_zero():
+    gauge = metrics.Gauge("test_in_flight", "Test.")
+    registry = metrics.Registry()
+    registry.register(gauge)
+
+    assert registry.render() == (
+        "# HELP test_in_flight Test.\n# TYPE test_in_flight gauge\ntest_in_flight 0\n"
+    )
+
+def make_app():
+    app = FastAPI()
+    seen_in_flight = []
+
+    @app.get("/api/metrics-test/{note_id}")
+    async def read_note(note_id: str):
+        seen_in_flight.append(metrics.HTTP_IN_FLIGHT._values[()])
+        return {"id": note_id}
+
+    app.add_middleware(metrics.MetricsMiddleware)
+    return app, seen_in_flight
+
+def test_middleware_labels_requests_by_route_template():
+    app, seen_in_flight = make_app()
+    with TestClient(app) as client:
+        assert client.get("/api/metrics-test/abc").status_code == 200
+        assert client.get("/api/metrics-test/def").status_code == 200
+        assert client.get("/api/metrics-test-nowhere").status_code == 404
+
+    output = metrics.REGISTRY.render()
+    assert 'http_requests_total{method="GET",route="/api/metrics-test/{note_id}",status="200"} 2' in output
+    assert 'route="/api/metrics-test/abc"' not in output
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"}' in output
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/metrics-test/{note_id}"} 2' in output
+
+    assert seen_in_flight == [1, 1]
+    assert metrics.HTTP_IN_FLIGHT._values[()] == 0
+    assert "http_requests_in_flight 0\n" in output
+
+def test_metrics_endpoint_requires_a_token(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(server.create_app())
+
+    assert client.get("/api/metrics").status_code == 403
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
+
+    admin_token = server.create_access_token({"role": "admin"})
+    assert client.get("/api/metrics", headers={"Authorization": f"Bearer {admin_token}"}).status_code == 200
+
+def test_pool_stats_leave_out_server_addresses():
+    listener = metrics.PoolListener(max_pool_size=4)
+
+    class Event:
+        address = ("db-secret.internal", 27017)
+        reason = "timeout"
+
+    listener.connection_created(Event)
+    listener.connection_check_out_started(Event)
+    listener.connection_checked_out(Event)
+
+    stats = listener.stats()
+    assert stats == {
+        "max_pool_size": 4, "saturation": 0.25, "servers": 1,
+        "open": 1, "checked_out": 1, "waiting": 0,
+    }
+    assert "db-secret" not in repr(stats)
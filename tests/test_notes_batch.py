@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import server
+
+def make_note(note_id, category, slug, title, object_id=0):
+    category_slug = server.slugify(category)
+    return {
+        "_id": object_id,
+        "id": note_id,
+        "title": title,
+        "description": "",
+        "category": category,
+        "category_slug": category_slug,
+        "slug": slug,
+        "pdf_file_id": "0" * 24,
+        "pdf_filename": f"{slug}.pdf",
+        "upload_date": "2024-05-01T10:03:04+00:00",
+        "share_link": f"{category_slug}/{slug}",
+        "order": 0,
+    }
+
+class StubCursor:
+    def __init__(self, docs, calls):
+        self._docs = docs
+        self._calls = calls
+
+    async def to_list(self, length):
+        self._calls.append(length)
+        return [dict(d) for d in self._docs][:length]
+
+class StubNotes:
+    """Evaluates the {"$or": [...]} filter get_notes_batch builds."""
+
+    def __init__(self, docs):
+        self._docs = docs
+        self.queries = []
+        self.to_list_lengths = []
+
+    def _matches(self, doc, clause):
+        for field, condition in clause.items():
+            if isinstance(condition, dict):
+                if doc.get(field) not in condition["$in"]:
+                    return False
+            elif doc.get(field) != condition:
+                return False
+        return True
+
+    def find(self, query, projection=None, sort=None):
+        self.queries.append(query)
+        docs = [d for d in self._docs if any(self._matches(d, c) for c in query["$or"])]
+        if sort:
+            for field, direction in reversed(sort):
+                docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        docs = [{k: v for k, v in d.items() if k != "_id"} for d in docs]
+        return StubCursor(docs, self.to_list_lengths)
+
+class StubDatabase:
+    def __init__(self, docs):
+        self.notes = StubNotes(docs)
+
+NOTES = [
+    make_note("id-algebra", "Mathematics", "intro", "Algebra", object_id=1),
+    make_note("id-history", "History", "intro", "Ancient History", object_id=2),
+    make_note("id-science", "Science", "cells", "Cells", object_id=3),
+]
+
+def run_batch(ids, docs=NOTES):
+    db = StubDatabase(docs)
+    results = asyncio.run(server.get_notes_batch(server.NoteBatchRequest(ids=ids), read_db=db))
+    return results, db.notes
+
+def test_batch_keeps_request_order_duplicates_and_missing():
+    ids = ["history/intro", "missing-id", "id-science", "mathematics/intro", "id-science", "science/nope"]
+
+    results, notes = run_batch(ids)
+
+    assert [r.key for r in results] == ids
+    assert [r.found for r in results] == [True, False, True, True, True, False]
+    assert [r.note.id if r.note else None for r in results] == [
+        "id-history", None, "id-science", "id-algebra", "id-science", None
+    ]
+    assert len(notes.queries) == 1
+
+def test_batch_matches_share_links_as_exact_pairs():
+    results, notes = run_batch(["history/intro", "science/cells"])
+
+    clauses = notes.queries[0]["$or"]
+    assert {"category_slug": "history", "slug": "intro"} in clauses
+    assert {"category_slug": "science", "slug": "cells"} in clauses
+    # mathematics/intro shares a slug with a requested link but is not part of the query
+    assert {"category_slug": "mathematics", "slug": "intro"} not in clauses
+    assert [r.note.id for r in results] == ["id-history", "id-science"]
+
+def test_batch_duplicate_share_link_does_not_hide_other_keys():
+    # update_note keeps the slug when moving a note, so two notes can share a pair
+    docs = [
+        make_note("original", "Mathematics", "intro", "Original", object_id=7),
+        make_note("moved", "Mathematics", "intro", "Moved", object_id=4),
+        make_note("c", "Science", "cells", "Cells", object_id=9),
+    ]
+
+    results, notes = run_batch(["mathematics/intro", "c"], docs)
+
+    assert notes.to_list_lengths == [None]
+    assert [r.found for r in results] == [True, True]
+    # lowest _id wins, like get_note_by_slug's sorted find_one
+    assert [r.note.id for r in results] == ["moved", "c"]
+
+def test_batch_empty_and_limit():
+    assert asyncio.run(server.get_notes_batch(server.NoteBatchRequest(ids=[]), read_db=StubDatabase([]))) == []
+    with pytest.raises(ValidationError):
+        server.NoteBatchRequest(ids=["x"] * (server.NOTE_BATCH_MAX + 1))
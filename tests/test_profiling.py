@@ -0,0 +1,92 @@
+import json
+import logging
+import re
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import profiling
+
+ADMIN_TOKEN = "admin-token"
+
+class DbEvent:
+    duration_micros = 20000
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def make_client(slow_threshold: float = 10.0) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        busy(0.05)
+        # what Motor's command listener reports for one 20 ms round trip
+        profiling.DbTimingListener().succeeded(DbEvent)
+        return JSONResponse({"done": True}, status_code=201)
+
+    app.add_middleware(
+        profiling.ProfilingMiddleware,
+        is_admin=lambda token: token == ADMIN_TOKEN,
+        slow_threshold=slow_threshold,
+        interval=0.001
+    )
+    return TestClient(app)
+
+@pytest.mark.parametrize("headers", [
+    {"X-Profile": "1"},
+    {"X-Profile": "1", "Authorization": "Bearer not-admin"},
+    {"X-Profile": "false", "Authorization": f"Bearer {ADMIN_TOKEN}"},
+    {"X-Profile": "0", "Authorization": f"Bearer {ADMIN_TOKEN}"},
+])
+def test_profile_not_taken_without_admin_and_opt_in(headers):
+    response = make_client().get("/work", headers=headers)
+
+    assert response.status_code == 201
+    assert response.json() == {"done": True}
+    assert "x-profile-status" not in response.headers
+
+@pytest.mark.parametrize("headers, params", [
+    ({"X-Profile": "1"}, None),
+    ({"X-Profile": "true"}, None),
+    ({}, {"profile": "1"}),
+])
+def test_admin_gets_folded_stack_profile(headers, params):
+    headers = {**headers, "Authorization": f"Bearer {ADMIN_TOKEN}"}
+    response = make_client().get("/work", headers=headers, params=params)
+
+    assert response.status_code == 200
+    assert response.headers["x-profile-status"] == "201"
+    assert response.headers["x-profile-db-calls"] == "1"
+    assert float(response.headers["x-profile-db-ms"]) == pytest.approx(20.0)
+    lines = response.text.splitlines()
+    assert lines
+    assert all(re.fullmatch(r"[^ ].*;.* \d+", line) for line in lines)
+    assert any("busy (" in line for line in lines)
+
+def test_slow_request_is_logged_with_db_breakdown(caplog):
+    client = make_client(slow_threshold=0.01)
+    with caplog.at_level(logging.WARNING, logger="study_vault.slow_requests"):
+        assert client.get("/work").status_code == 201
+
+    records = [r for r in caplog.records if r.name == "study_vault.slow_requests"]
+    assert len(records) == 1
+    entry = json.loads(records[0].getMessage())
+    assert entry["path"] == "/work"
+    assert entry["route"] == "/work"
+    assert entry["status"] == 201
+    assert entry["db_calls"] == 1
+    assert entry["db_ms"] == pytest.approx(20.0)
+    assert entry["python_ms"] == pytest.approx(entry["duration_ms"] - entry["db_ms"], abs=0.01)
+    assert entry["duration_ms"] >= 50
+
+def test_fast_request_is_not_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="study_vault.slow_requests"):
+        make_client(slow_threshold=10.0).get("/work")
+
+    assert not [r for r in caplog.records if r.name == "study_vault.slow_requests"]